@@ -1,47 +1,90 @@
 import google.generativeai as genai
+import diskcache
 import os
-from typing import List, Dict, Tuple
-import textwrap
+import functools
+import re
+import hashlib
+import json
+from typing import List, Dict, Tuple, Optional, Callable
 from rich.console import Console
 from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.prompt import Prompt
 from rich.layout import Layout
 from rich.live import Live
-from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.syntax import Syntax
-import numpy as np
-import matplotlib.pyplot as plt
-from io import BytesIO
-import base64
+from rich.table import Table, Column
 import time
-from concurrent.futures import ThreadPoolExecutor
-import networkx as nx
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from collections import deque
 
+EMBEDDING_MODEL = 'models/text-embedding-004'
+SEMANTIC_THRESHOLD = 0.92
+SEMANTIC_CACHE_SIZE = 512
+DISK_CACHE_DIR = '.cache/universal'
+SEMANTIC_CACHE_DIR = '.cache/universal-semantic'
+DISK_CACHE_TTL = 3600
+
+_WELCOME = Panel(
+    "[bold blue]Universal Agent - Advanced World of Thought System[/bold blue]\n"
+    "Quantum-enabled reasoning engine with advanced scientific analysis.\n"
+    "Type 'exit' to quit, 'stats' for session statistics, 'viz' for thought visualization.",
+    border_style="blue"
+)
+
+class _SessionExit(Exception):
+    """Raised by the 'exit' command to leave the interactive loop."""
+
+@functools.lru_cache(maxsize=4)
+def _load_prompt(path: str, mtime: float) -> str:
+    """Read a prompt file; mtime is part of the cache key so edits are picked up."""
+    with open(path, 'r') as f:
+        return f.read()
+
+def _append_turns(chat, turns: List[Tuple[str, str]]):
+    """Append (query, answer) exchanges to a chat session's history."""
+    history = list(chat.history)
+    for query, answer in turns:
+        history.append({'role': 'user', 'parts': [query]})
+        history.append({'role': 'model', 'parts': [answer]})
+    chat.history = history
+
+def _history_turns(history) -> List[Tuple[str, str]]:
+    """Flatten chat history contents into (role, text) pairs."""
+    return [(content.role, "".join(part.text for part in content.parts)) for content in history]
+
+def _new_science_table() -> Table:
+    """Create an empty table with the science analysis columns."""
+    return Table(
+        Column("Principle", style="cyan"),
+        Column("Application Score", style="magenta"),
+        title="Scientific Principle Analysis"
+    )
+
+def _complexity_score(text: str) -> float:
+    """Ratio of unique words to total words."""
+    words = text.split()
+    return len(set(words)) / (len(words) or 1)
+
 class ThoughtVisualizer:
     def __init__(self):
-        self.thought_graph = nx.DiGraph()
+        self._thoughts: List[Tuple[int, str, str]] = []
         self.thought_queue = deque(maxlen=10)
 
     def add_thought(self, thought: str, category: str):
-        """Add a thought node to the graph."""
-        timestamp = time.time()
-        self.thought_graph.add_node(timestamp, thought=thought, category=category)
-        if len(self.thought_queue) > 0:
-            self.thought_graph.add_edge(list(self.thought_queue)[-1], timestamp)
-        self.thought_queue.append(timestamp)
+        """Record a thought and mark it as the most recent."""
+        self._thoughts.append((time.monotonic_ns(), thought, category))
+        self.thought_queue.append(len(self._thoughts) - 1)
 
     def generate_visualization(self) -> str:
         """Generate an ASCII visualization of the thought process."""
-        if len(self.thought_graph) == 0:
+        if not self._thoughts:
             return "No thoughts processed yet."
 
         visualization = []
-        for node in self.thought_queue:
-            thought = self.thought_graph.nodes[node]['thought']
-            category = self.thought_graph.nodes[node]['category']
+        for index in self.thought_queue:
+            _, thought, category = self._thoughts[index]
             visualization.append(f"[{category}] {thought}")
 
         return "\n└─> ".join(visualization)
@@ -56,17 +99,156 @@ class ScienceAnalyzer:
             'relativity': ['time dilation', 'mass-energy', 'gravity'],
             'biology': ['evolution', 'adaptation', 'homeostasis']
         }
+        # One alternation per category so each is scanned in a single pass.
+        # Longer principles are tried first; where one principle contains
+        # another, only the longer one is counted at that position.
+        self._patterns = {
+            category: re.compile("|".join(
+                re.escape(p.lower()) for p in sorted(principles, key=len, reverse=True)
+            ))
+            for category, principles in self.principles.items()
+        }
+        self._denoms = {category: len(principles) for category, principles in self.principles.items()}
 
     def analyze_text(self, text: str) -> Dict[str, float]:
         """Analyze text for scientific principle applications."""
-        scores = {}
-        for category, principles in self.principles.items():
-            score = sum(principle.lower() in text.lower() for principle in principles)
-            scores[category] = score / len(principles)
-        return scores
+        text = text.lower()
+        return {
+            category: len(set(pattern.findall(text))) / self._denoms[category]
+            for category, pattern in self._patterns.items()
+        }
+
+class GeminiBatcher:
+    """Groups concurrently submitted queries into a single Gemini request.
+
+    The worker thread owns the chat session; other threads read or extend its
+    history through history() and append_turns(), which share the same lock.
+    """
+
+    def __init__(self, chat, max_batch: int = 8):
+        self.chat = chat
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._chat_lock = threading.Lock()
+        self._shutdown_lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, query: str, on_chunk: Optional[Callable[[str], None]] = None) -> Future:
+        """Queue a query and return a future resolving to the answer text.
+
+        on_chunk, if given, is called with the accumulated text as it streams in.
+        """
+        with self._shutdown_lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit queries after the batcher is closed")
+            future = Future()
+            self._queue.put((query, future, on_chunk))
+        return future
+
+    def close(self):
+        """Stop the worker thread once queued queries have been answered."""
+        with self._shutdown_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+
+    def history(self) -> list:
+        """Return a snapshot of the chat history."""
+        with self._chat_lock:
+            return list(self.chat.history)
+
+    def append_turns(self, turns: List[Tuple[str, str]]):
+        """Append (query, answer) exchanges without racing an in-flight request."""
+        with self._chat_lock:
+            _append_turns(self.chat, turns)
+
+    def _run(self):
+        """Send each query as soon as it arrives, batching any that queued up meanwhile."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # Queries pile up while a request is in flight; a lone caller never waits
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._flush(batch)
+                    return
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[str, Future, Optional[Callable[[str], None]]]]):
+        """Answer a batch of queries and resolve their futures."""
+        # Drop cancelled futures; the rest can no longer be cancelled
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        queries = [query for query, _, _ in batch]
+        try:
+            with self._chat_lock:
+                if len(queries) == 1:
+                    answers = [self._stream(queries[0], batch[0][2])]
+                else:
+                    answers = self._send_batch(queries)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, on_chunk), answer in zip(batch, answers):
+            try:
+                if on_chunk and len(batch) > 1:
+                    on_chunk(answer)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(answer)
+
+    def _stream(self, query: str, on_chunk: Optional[Callable[[str], None]]) -> str:
+        """Send a single query through the chat session, streaming the reply."""
+        response = self.chat.send_message(query, stream=True)
+        chunks = []
+        try:
+            for chunk in response:
+                chunks.append(chunk.text)
+                if on_chunk:
+                    on_chunk("".join(chunks))
+            # Commit the exchange now so a bad finish reason surfaces here
+            self.chat.history
+        except Exception:
+            # Drop the broken exchange, otherwise every later history access raises
+            self.chat.rewind()
+            raise
+        return "".join(chunks)
+
+    def _send_batch(self, queries: List[str]) -> List[str]:
+        """Ask several questions in one request and split the JSON-array reply."""
+        prompt = (
+            "Answer each of the following questions independently. "
+            "Respond with a JSON array of strings containing one answer per question, in order.\n---\n"
+            + "\n".join(f"Q{i}: {query}" for i, query in enumerate(queries, 1))
+        )
+        response = self.chat.model.generate_content(
+            list(self.chat.history) + [{'role': 'user', 'parts': [prompt]}],
+            generation_config={'response_mime_type': 'application/json'}
+        )
+        answers = json.loads(response.text)
+        if (not isinstance(answers, list) or len(answers) != len(queries)
+                or not all(isinstance(answer, str) for answer in answers)):
+            raise ValueError(f"Expected {len(queries)} batched string answers, got: {response.text[:200]}")
+
+        _append_turns(self.chat, list(zip(queries, answers)))
+        return answers
 
 class UniversalAgent:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, semantic_cache: bool = True):
         """Initialize the Universal agent with enhanced capabilities."""
         self.console = Console()
         self.layout = Layout()
@@ -79,13 +261,48 @@ class UniversalAgent:
         self.executor = ThreadPoolExecutor(max_workers=3)
 
         # Load system prompt
-        with open('universal_prompt.md', 'r') as f:
-            self.system_prompt = f.read()
+        self.system_prompt = _load_prompt('universal_prompt.md', os.stat('universal_prompt.md').st_mtime)
 
         # Initialize chat and response history
         self.chat = self.model.start_chat(history=[])
         self.response_history = []
+        self._response_times: List[float] = []
         self._initialize_chat()
+        # Turns before this index are the system-prompt exchange, covered by the cache key
+        self._history_base = len(self.chat.history)
+        self._batcher = GeminiBatcher(self.chat)
+
+        # Disk caches are opened last so a failed initialization leaves nothing open.
+        # Exact-match response cache shared across sessions: key -> (response text, analysis).
+        # Keys include the conversation so far, so an entry is only reused when a
+        # session replays the same turns, e.g. a repeated first query.
+        # Semantic cache: normalized embeddings of first-turn queries, one row per
+        # cached response, persisted so paraphrases can hit in later sessions.
+        self._disk = None
+        try:
+            self._disk = diskcache.Cache(DISK_CACHE_DIR)
+            self._semantic_disk = diskcache.Cache(SEMANTIC_CACHE_DIR)
+        except Exception:
+            if self._disk is not None:
+                self._disk.close()
+            self._batcher.close()
+            raise
+
+        self.semantic_cache = semantic_cache
+        self._emb = None
+        self._emb_responses = []
+        if semantic_cache:
+            self._load_semantic_cache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Release the batcher and executor threads and the disk cache."""
+        self._batcher.close()
+        self.executor.shutdown(wait=False)
+        self._disk.close()
+        self._semantic_disk.close()
 
     def _initialize_chat(self):
         """Initialize the chat with enhanced monitoring."""
@@ -99,17 +316,91 @@ class UniversalAgent:
             self.console.print(f"[red]Initialization Error: {str(e)}[/red]")
             raise
 
+    def _conversation(self) -> List[Tuple[str, str]]:
+        """Return the (role, text) turns exchanged after the system prompt."""
+        return _history_turns(self._batcher.history()[self._history_base:])
+
+    def _cache_key(self, query: str, conversation: List[Tuple[str, str]]) -> str:
+        """Build a cache key for a query in the context of the conversation so far."""
+        payload = json.dumps(
+            {'sys': self.system_prompt, 'history': conversation, 'q': query},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _embed_query(self, query: str):
+        """Embed a query as an L2-normalized float32 vector."""
+        import numpy as np
+
+        result = genai.embed_content(model=EMBEDDING_MODEL, content=query)
+        vec = np.asarray(result['embedding'], dtype=np.float32)
+        return vec / (np.linalg.norm(vec) or 1.0)
+
+    def _load_semantic_cache(self):
+        """Build the embedding matrix from persisted (embedding, text, analysis) entries."""
+        try:
+            self._semantic_disk.expire()
+            entries = [self._semantic_disk.get(key) for key in self._semantic_disk]
+        except Exception as e:
+            self.console.print(f"[yellow]Semantic cache read failed: {str(e)}[/yellow]")
+            return
+
+        entries = [entry for entry in entries if entry is not None][-SEMANTIC_CACHE_SIZE:]
+        if not entries:
+            return
+
+        import numpy as np
+
+        self._emb = np.stack([q_vec for q_vec, _, _ in entries])
+        self._emb_responses = [(text, analysis) for _, text, analysis in entries]
+
+    def _semantic_lookup(self, q_vec):
+        """Return the cached (text, analysis) of the most similar prior query, if close enough."""
+        if self._emb is None:
+            return None
+        sims = self._emb @ q_vec
+        best = int(sims.argmax())
+        if sims[best] >= SEMANTIC_THRESHOLD:
+            return self._emb_responses[best]
+        return None
+
+    def _lookup_cache(self, key: str) -> Optional[Tuple[str, Dict]]:
+        """Look up an exact-match entry in the disk cache."""
+        try:
+            return self._disk.get(key)
+        except Exception as e:
+            self.console.print(f"[yellow]Disk cache read failed: {str(e)}[/yellow]")
+            return None
+
+    def _cache_response(self, key: str, q_vec, text: str, analysis: Dict):
+        """Store a fresh response in the exact-match and semantic caches."""
+        try:
+            self._disk.set(key, (text, analysis), expire=DISK_CACHE_TTL)
+        except Exception as e:
+            # The answer was already shown; a failed write only loses the cache entry
+            self.console.print(f"[yellow]Disk cache write failed: {str(e)}[/yellow]")
+
+        # Later turns in this session never consult the semantic cache, so the
+        # embedding only needs to reach disk for future sessions
+        if q_vec is not None:
+            try:
+                self._semantic_disk.set(key, (q_vec, text, analysis), expire=DISK_CACHE_TTL)
+            except Exception as e:
+                self.console.print(f"[yellow]Semantic cache write failed: {str(e)}[/yellow]")
+
+    def _record_turn(self, query: str, text: str):
+        """Append a cached exchange to the chat history so it stays in sync with the display."""
+        self._batcher.append_turns([(query, text)])
+
     def _analyze_response(self, response: str) -> Dict:
         """Analyze response using scientific principles."""
-        # Scientific principle analysis
-        science_scores = self.science_analyzer.analyze_text(response)
-
-        # Complexity analysis
-        complexity_score = len(set(response.split())) / len(response.split())
+        # Scientific principle and complexity analysis run concurrently
+        science_future = self.executor.submit(self.science_analyzer.analyze_text, response)
+        complexity_future = self.executor.submit(_complexity_score, response)
 
         return {
-            'science_scores': science_scores,
-            'complexity': complexity_score
+            'science_scores': science_future.result(),
+            'complexity': complexity_future.result()
         }
 
     def _generate_thought_map(self) -> Panel:
@@ -123,10 +414,7 @@ class UniversalAgent:
 
     def _create_science_table(self, scores: Dict[str, float]) -> Table:
         """Create a table showing scientific principle application."""
-        table = Table(title="Scientific Principle Analysis")
-        table.add_column("Principle", style="cyan")
-        table.add_column("Application Score", style="magenta")
-
+        table = _new_science_table()
         for principle, score in scores.items():
             table.add_row(principle, f"{score:.2f}")
 
@@ -138,26 +426,40 @@ class UniversalAgent:
             # Add query to thought process
             self.thought_visualizer.add_thought(f"Query received: {query}", "INPUT")
 
-            # Use a single progress display for the entire process
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                transient=True
-            ) as progress:
-                # Generate response
-                task1 = progress.add_task("Generating response...", total=100)
-                response = self.chat.send_message(query)
-                progress.update(task1, completed=100)
-
-                # Analyze response
-                task2 = progress.add_task("Analyzing response...", total=100)
-                analysis = self._analyze_response(response.text)
-                progress.update(task2, completed=100)
-
-            # Create and display results
-            self.console.print("\n[bold cyan]Response:[/bold cyan]")
-            self.console.print(Panel(Markdown(response.text)))
+            start = time.perf_counter()
+            conversation = self._conversation()
+            key = self._cache_key(query, conversation)
+            q_vec = None
+            cached = self._lookup_cache(key)
+            # Embeddings ignore context, so near-duplicates only count with no prior turns
+            if cached is None and self.semantic_cache and not conversation:
+                try:
+                    q_vec = self._embed_query(query)
+                    cached = self._semantic_lookup(q_vec)
+                except Exception as e:
+                    # The semantic cache is an optimization; fall through to Gemini
+                    q_vec = None
+                    self.console.print(f"[yellow]Semantic cache unavailable: {str(e)}[/yellow]")
 
+            self.console.print("\n[bold cyan]Response:[/bold cyan]")
+            if cached is not None:
+                # Cache hit: skip both the Gemini call and the analysis
+                text, analysis = cached
+                self._record_turn(query, text)
+                self.console.print(Panel(Markdown(text)))
+            else:
+                # Stream the response into the console as it is generated
+                with Live(Panel(Markdown("")), console=self.console, refresh_per_second=12) as live:
+                    text = self._batcher.submit(
+                        query, on_chunk=lambda partial: live.update(Panel(Markdown(partial)))
+                    ).result()
+
+                analysis = self._analyze_response(text)
+                self._cache_response(key, q_vec, text, analysis)
+
+            self._response_times.append(time.perf_counter() - start)
+
+            # Display thought process and analysis
             self.console.print("\n[bold cyan]Thought Process:[/bold cyan]")
             self.console.print(self._generate_thought_map())
 
@@ -170,7 +472,7 @@ class UniversalAgent:
                 "OUTPUT"
             )
 
-            return response.text
+            return text
 
         except Exception as e:
             error_msg = f"Error in processing: {str(e)}"
@@ -179,48 +481,52 @@ class UniversalAgent:
 
     def run_interactive(self):
         """Run the agent with enhanced interactive features."""
-        welcome_panel = Panel(
-            "[bold blue]Universal Agent - Advanced World of Thought System[/bold blue]\n"
-            "Quantum-enabled reasoning engine with advanced scientific analysis.\n"
-            "Type 'exit' to quit, 'stats' for session statistics, 'viz' for thought visualization.",
-            border_style="blue"
-        )
-        self.console.print(welcome_panel)
+        self.console.print(_WELCOME)
+
+        commands = {
+            'exit': self._cmd_exit,
+            'stats': self._display_session_stats,
+            'viz': self._cmd_viz,
+        }
 
         while True:
             try:
                 query = Prompt.ask("\n[bold green]Enter your query")
 
-                if query.lower() == 'exit':
-                    self.console.print("[yellow]Shutting down quantum systems... Goodbye![/yellow]")
-                    break
-                elif query.lower() == 'stats':
-                    self._display_session_stats()
-                    continue
-                elif query.lower() == 'viz':
-                    self.console.print(self._generate_thought_map())
+                handler = commands.get(query.lower())
+                if handler:
+                    handler()
                     continue
 
                 self.process_query(query)
 
+            except _SessionExit:
+                break
             except KeyboardInterrupt:
                 self.console.print("\n[yellow]Emergency shutdown initiated... Goodbye![/yellow]")
                 break
             except Exception as e:
                 self.console.print(f"[red]Critical error: {str(e)}[/red]")
 
+    def _cmd_exit(self):
+        """Handle the 'exit' command."""
+        self.console.print("[yellow]Shutting down quantum systems... Goodbye![/yellow]")
+        raise _SessionExit()
+
+    def _cmd_viz(self):
+        """Handle the 'viz' command."""
+        self.console.print(self._generate_thought_map())
+
     def _display_session_stats(self):
         """Display session statistics."""
+        import numpy as np
+
         stats_table = Table(title="Session Statistics")
         stats_table.add_column("Metric", style="cyan")
         stats_table.add_column("Value", style="magenta")
 
-        num_queries = len(self.thought_visualizer.thought_queue)
-        avg_response_time = np.mean([
-            node[1]['response_time']
-            for node in self.thought_visualizer.thought_graph.nodes(data=True)
-            if 'response_time' in node[1]
-        ]) if num_queries > 0 else 0
+        num_queries = len(self._response_times)
+        avg_response_time = np.mean(self._response_times) if num_queries > 0 else 0
 
         stats_table.add_row("Total Queries", str(num_queries))
         stats_table.add_row("Average Response Time", f"{avg_response_time:.2f}s")
@@ -234,8 +540,8 @@ def main():
         return
 
     try:
-        agent = UniversalAgent(api_key)
-        agent.run_interactive()
+        with UniversalAgent(api_key) as agent:
+            agent.run_interactive()
     except Exception as e:
         print(f"Critical system error: {str(e)}")
 